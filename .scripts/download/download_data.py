@@ -1,10 +1,54 @@
 #!/usr/bin/env python3
-from typing import Any
+from typing import Any, Dict, List, Tuple, Union, Optional, Sequence
 from pathlib import Path
+from threading import Lock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from concurrent.futures import ThreadPoolExecutor
+import json
+import shutil
+import hashlib
 import argparse
 
 _CNT = 0  # increment this when you want to rebuild the CI cache
 _ROOT = Path.home() / ".cache" / "squidpy"
+_MANIFEST = _ROOT / "manifest.json"
+_CHUNK_SIZE = 1 << 20
+
+
+class _Progress:
+    """Thread-safe aggregated progress of multiple downloads, printed as a single line."""
+
+    def __init__(self, n_files: int):
+        self._lock = Lock()
+        self._n_files = n_files
+        self._n_done = 0
+        self._n_bytes = 0
+        self._n_total = 0
+
+    def start(self, n_bytes: int, n_total: int) -> None:
+        with self._lock:
+            self._n_bytes += n_bytes
+            self._n_total += n_total
+            self._print()
+
+    def update(self, n_bytes: int) -> None:
+        with self._lock:
+            self._n_bytes += n_bytes
+            self._print()
+
+    def finish(self) -> None:
+        with self._lock:
+            self._n_done += 1
+            self._print(end="\n" if self._n_done == self._n_files else "")
+
+    def _print(self, end: str = "") -> None:
+        print(
+            f"\r[Downloading] {self._n_done}/{self._n_files} files, "
+            f"{self._n_bytes / 2 ** 20:.1f}/{self._n_total / 2 ** 20:.1f} MiB",
+            end=end,
+            flush=True,
+        )
 
 
 def _print_message(func_name: str, path: Path, *, dry_run: bool = False) -> None:
@@ -15,7 +59,144 @@ def _print_message(func_name: str, path: Path, *, dry_run: bool = False) -> None
         print(f"{prefix}[Downloading] {func_name:>25} -> {str(path):>25}")
 
 
-def _maybe_download_data(func_name: str, path: Path) -> Any:
+def _get_url(func_name: str) -> str:
+    import squidpy as sq
+
+    for module in (sq.datasets._dataset, sq.datasets._image):
+        for obj in vars(module).values():
+            if getattr(obj, "name", None) == func_name and isinstance(getattr(obj, "url", None), str):
+                return obj.url
+
+    raise ValueError(f"Unable to find the URL for `{func_name}`.")
+
+
+def _download(url: str, path: Path, progress: Optional[_Progress] = None, *, timeout: float = 60) -> Path:
+    """Stream ``url`` into ``path``, resuming from a previously interrupted ``{path}.part``, if present."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    part = path.with_name(path.name + ".part")
+    offset = part.stat().st_size if part.is_file() else 0
+    headers = {"User-Agent": "squidpy_notebooks"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as resp:
+            if resp.status != 206:
+                # the server ignored the range request, start from scratch
+                offset = 0
+            if progress is not None:
+                progress.start(offset, offset + int(resp.headers.get("Content-Length", 0)))
+
+            with open(part, "ab" if offset else "wb") as fout:
+                while True:
+                    chunk = resp.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fout.write(chunk)
+                    if progress is not None:
+                        progress.update(len(chunk))
+    except HTTPError as e:
+        # 416 Range Not Satisfiable: the `.part` file has been already fully downloaded
+        if e.code != 416 or not offset:
+            raise
+        if progress is not None:
+            progress.start(offset, offset)
+
+    part.replace(path)
+    if progress is not None:
+        progress.finish()
+
+    return path
+
+
+def _download_parallel(urls: List[Tuple[str, Path]], n_jobs: int) -> List[Path]:
+    progress = _Progress(len(urls))
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(_download, url, path, progress) for url, path in urls]
+        return [future.result() for future in futures]
+
+
+def _hash_file(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fin:
+        # hashlib releases the GIL for large chunks, so this runs concurrently in threads
+        for chunk in iter(lambda: fin.read(_CHUNK_SIZE), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def _read_manifest(path: Path = _MANIFEST) -> Dict[str, Dict[str, Union[int, str]]]:
+    if not path.is_file():
+        return {}
+    with open(path) as fin:
+        return json.load(fin)
+
+
+def _write_manifest(manifest: Dict[str, Dict[str, Union[int, str]]], path: Path = _MANIFEST) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as fout:
+        json.dump(manifest, fout, indent=4, sort_keys=True)
+    tmp.replace(path)
+
+
+def _manifest_entry(path: Path) -> Dict[str, Union[int, str]]:
+    return {"size": path.stat().st_size, "sha256": _hash_file(path)}
+
+
+def _verify_file(path: Path, entry: Dict[str, Union[int, str]]) -> bool:
+    if not path.is_file() or path.stat().st_size != entry["size"]:
+        return False
+
+    return _hash_file(path) == entry["sha256"]
+
+
+def _verify(
+    paths: Sequence[Path], manifest: Dict[str, Dict[str, Union[int, str]]], n_jobs: Optional[int] = None
+) -> Dict[Path, bool]:
+    """Check ``paths`` against their ``manifest`` entries without loading them. Files without an entry are skipped."""
+    paths = [path for path in paths if path.name in manifest]
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return dict(zip(paths, executor.map(lambda p: _verify_file(p, manifest[p.name]), paths)))
+
+
+def _level_path(path: Path, level: int) -> Path:
+    return path if not level else path.with_name(f"{path.stem}_level{level}{path.suffix}")
+
+
+def _write_zarr(img: Any, path: Path, *, chunks: int = 512, n_levels: int = 4) -> List[Path]:
+    """
+    Save ``img`` as a chunked Zarr store into ``path``, in the layout of :meth:`squidpy.im.ImageContainer.save`.
+
+    The store can be opened lazily with ``ImageContainer.load(path, chunks={})``, reading only the accessed chunks.
+    Level ``i`` of the multiscale pyramid is downscaled by ``2 ** i`` and saved into ``{path.stem}_level{i}.zarr``.
+    """
+    paths = []
+    for level in range(n_levels):
+        if level:
+            if min(img.shape) < 2 * chunks:
+                break
+            img = img.crop_corner(0, 0, scale=0.5)
+        for arr in img.data.data_vars.values():
+            arr.encoding = {"chunks": (chunks, chunks) + arr.shape[2:]}
+
+        target = _level_path(path, level)
+        # write into a temporary directory first, so that an interrupted conversion is never picked up
+        tmp = target.with_name(target.name + ".tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        img.save(tmp)
+        if target.exists():
+            shutil.rmtree(target)
+        tmp.rename(target)
+        paths.append(target)
+
+    return paths
+
+
+def _maybe_download_data(func_name: str, path: Path, manifest: Optional[Dict[str, Any]] = None) -> Any:
     import squidpy as sq
 
     try:
@@ -23,11 +204,33 @@ def _maybe_download_data(func_name: str, path: Path) -> Any:
     except Exception as e:
         print(f"File {str(path):>25} seems to be corrupted: {e}. Removing and retrying")
         path.unlink()
+        if manifest is not None:
+            manifest.pop(path.name, None)
 
         return getattr(sq.datasets, func_name)(path=path)
 
 
 def main(args: argparse.Namespace) -> None:
+    manifest = _read_manifest()
+    if args.verify or args.repair:
+        if not manifest:
+            raise SystemExit(f"No manifest found in `{_MANIFEST}`.")
+
+        status = _verify([_ROOT / fname for fname in sorted(manifest)], manifest, n_jobs=args.jobs)
+        for path, ok in status.items():
+            print(f"[{'OK' if ok else 'FAILED':>6}] {str(path):>25}")
+        failed = [path for path, ok in status.items() if not ok]
+        if not args.repair:
+            if failed:
+                raise SystemExit(f"{len(failed)} file(s) failed the verification.")
+            return
+        # removed, so that they are downloaded again below
+        for path in failed:
+            print(f"File {str(path):>25} does not match the manifest. Removing")
+            if path.is_file():
+                path.unlink()
+            del manifest[path.name]
+
     from anndata import AnnData
     import squidpy as sq
 
@@ -40,22 +243,77 @@ def main(args: argparse.Namespace) -> None:
             _print_message(func_name, path, dry_run=True)
         return
 
-    # could be parallelized, but on CI it largely does not matter (usually limited to 2 cores + bandwidth limit)
+    # only the size is checked here, hashing all the files is left to `--verify`
+    paths = [_ROOT / f"{func_name}.{ext}" for func_name, ext in zip(all_datasets, all_extensions)]
+    for path in paths:
+        if path.name in manifest and (not path.is_file() or path.stat().st_size != manifest[path.name]["size"]):
+            if path.is_file():
+                print(f"File {str(path):>25} does not match the manifest. Removing")
+                path.unlink()
+            del manifest[path.name]
+
+    if args.jobs is not None and args.jobs > 1:
+        # only fetch the missing files here, they are validated by loading them below
+        urls: List[Tuple[str, Path]] = []
+        for func_name, ext in zip(all_datasets, all_extensions):
+            path = _ROOT / f"{func_name}.{ext}"
+            if not path.is_file():
+                urls.append((_get_url(func_name), path))
+        _download_parallel(urls, n_jobs=args.jobs)
+
+    # on CI, the default is serial (usually limited to 2 cores + bandwidth limit), see `--jobs`
     for func_name, ext in zip(all_datasets, all_extensions):
         path = _ROOT / f"{func_name}.{ext}"
+        zarr_path = path.with_suffix(".zarr")
+        if path.name in manifest and not (args.zarr and ext == "tiff" and not zarr_path.is_dir()):
+            # already validated by loading it before it was added to the manifest
+            print(f"[Cached]      {func_name:>25} <- {str(path):>25}")
+            continue
 
         _print_message(func_name, path)
-        obj = _maybe_download_data(func_name, path)
+        obj = _maybe_download_data(func_name, path, manifest)
 
         # we could do without the AnnData check as well (1 less req. in tox.ini), but it's better to be safe
         assert isinstance(obj, (AnnData, sq.im.ImageContainer)), type(obj)
         assert path.is_file(), path
 
+        if args.zarr and isinstance(obj, sq.im.ImageContainer) and not zarr_path.is_dir():
+            print(f"[Converting]  {func_name:>25} -> {str(zarr_path):>25}")
+            _write_zarr(obj, zarr_path)
+
+    # only the new and the downloaded again files are hashed
+    new = [path for path in paths if path.name not in manifest]
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        manifest.update(zip([path.name for path in new], executor.map(_manifest_entry, new)))
+    _write_manifest(manifest)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download data used for tutorials/examples.")
     parser.add_argument(
         "--dry-run", action="store_true", help="Do not download any data, just print what would be downloaded."
     )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help=f"Only check the size and hash of the cached files against `{_MANIFEST}`, without loading them.",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Same as `--verify`, but remove the files which fail the verification and download them again.",
+    )
+    parser.add_argument(
+        "--zarr",
+        action="store_true",
+        help="Also store the images as chunked Zarr stores, with their downscaled levels, next to the TIFF files.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker threads. By default, the downloads are serial and the hashing uses all cores. "
+        "If > 1, interrupted downloads are resumed from their `.part` files.",
+    )
 
     main(parser.parse_args())
@@ -8,6 +8,9 @@
 from pathlib import Path
 import os
 import sys
+import atexit
+import shutil
+import tempfile
 
 from datetime import datetime
 
@@ -22,7 +25,14 @@ from sphinx.application import Sphinx
 HERE = Path(__file__).parent
 sys.path.insert(0, str(HERE.parent.parent))  # this way, we don't have to install squidpy
 
-from docs.source.monkeypatch import save_rst_example  # noqa: E402
+from docs.source.monkeypatch import (  # noqa: E402
+    generate_file_rst,
+    save_rst_example,
+    execute_code_block,
+    prune_gallery_cache,
+)
+from docs.source.dataset_cache import CACHE_DIR_ENV as DATASET_CACHE_ENV, install as install_dataset_cache  # noqa: E402
+from docs.source.process_cache import install as install_process_cache  # noqa: E402
 
 sys.path.insert(0, os.path.abspath("_ext"))
 needs_sphinx = "3.0"
@@ -120,6 +130,8 @@ sphinx_gallery_conf = {
     "examples_dirs": [_root / "examples", _root / "tutorials"],
     "gallery_dirs": ["auto_examples", "auto_tutorials"],
     "abort_on_example_error": True,
+    # number of processes executing the examples, see `docs/source/monkeypatch.py`
+    "n_jobs": int(os.environ.get("SQUIDPY_NOTEBOOKS_GALLERY_JOBS", 1)),
     "show_memory": True,
     "reference_url": {
         "sphinx_gallery": None,
@@ -193,7 +205,21 @@ github_repo = "squidpy"
 github_repo_nb = "squidpy_notebooks"
 
 sphinx_gallery.gen_rst.save_rst_example = save_rst_example
+# profile the wall time, peak memory and the hot functions of each code block
+sphinx_gallery.gen_rst.execute_code_block = execute_code_block
+# restore the outputs of the examples which did not change since the last build
+sphinx_gallery.gen_rst.generate_file_rst = generate_file_rst
+# parse each AnnData dataset only once, the parsed datasets are kept on disk rather than in the memory of this process,
+# so that they don't count towards the memory usage of the examples executed after the one which loaded them
+if not os.environ.get(DATASET_CACHE_ENV):
+    os.environ[DATASET_CACHE_ENV] = tempfile.mkdtemp(prefix="squidpy_datasets_")
+    atexit.register(shutil.rmtree, os.environ[DATASET_CACHE_ENV], ignore_errors=True)
+install_dataset_cache()
+# opt-in, reuse the processed and segmented layers from the previous builds, see `SQUIDPY_NOTEBOOKS_PROCESS_CACHE`
+install_process_cache()
 
 
 def setup(app: Sphinx) -> None:
     app.add_css_file("css/custom.css")
+    # remove the cached examples which were not used in this build, otherwise the cache only grows
+    app.connect("build-finished", prune_gallery_cache)
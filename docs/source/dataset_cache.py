@@ -0,0 +1,83 @@
+from typing import Any, Callable, Optional
+from pathlib import Path
+from functools import wraps
+import os
+import pickle
+import hashlib
+
+# opt-in, set by the test suite and the documentation, so that the scripts executed in separate processes share it
+CACHE_DIR_ENV = "SQUIDPY_NOTEBOOKS_DATASET_CACHE"
+# same as in `.scripts/download/download_data.py`
+_DATA_DIR = Path.home() / ".cache" / "squidpy"
+
+
+def _prefer_zarr(func: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        path = args[0] if args else kwargs.get("path")
+        path = Path(_DATA_DIR / f"{func.__name__}.tiff" if path is None else path).with_suffix(".zarr")
+        # written by `download_data.py --zarr`, only the accessed chunks are read instead of decoding the whole TIFF
+        if path.is_dir():
+            import squidpy as sq
+
+            return sq.im.ImageContainer.load(path, chunks={})
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _cached(func: Callable[..., Any], cache_dir: Path) -> Callable[..., Any]:
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        key = repr((func.__name__, args, sorted(kwargs.items())))
+        path = cache_dir / f"{func.__name__}-{hashlib.sha1(key.encode()).hexdigest()}.pickle"
+        # each call unpickles a new object, nothing is kept in memory between the scripts
+        if path.is_file():
+            with open(path, "rb") as fin:
+                return pickle.load(fin)
+
+        obj = func(*args, **kwargs)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}")
+        with open(tmp, "wb") as fout:
+            pickle.dump(obj, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+        return obj
+
+    return wrapper
+
+
+def install(cache_dir: Optional[Path] = None) -> None:
+    """
+    Cache the datasets loaded by :mod:`squidpy.datasets` on disk, so that each of them is parsed only once.
+
+    Only the :class:`anndata.AnnData` datasets are cached. The images are kept lazy, so that the scripts
+    only read the parts they need, and are opened from their Zarr copies, if created by ``download_data.py --zarr``.
+
+    Parameters
+    ----------
+    cache_dir
+        Directory where to pickle the loaded datasets, so that they can be shared between processes.
+        If `None`, use the directory from the ``SQUIDPY_NOTEBOOKS_DATASET_CACHE`` environment variable.
+        If it is not set, nothing is installed.
+
+    Returns
+    -------
+    None
+    """
+    if cache_dir is None:
+        if not os.environ.get(CACHE_DIR_ENV):
+            return
+        cache_dir = Path(os.environ[CACHE_DIR_ENV])
+
+    import squidpy as sq
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name in sq.datasets._dataset.__all__ + sq.datasets._image.__all__:
+        func = getattr(sq.datasets, name)
+        if getattr(func, "_installed", False):
+            continue
+        func = _prefer_zarr(func) if name in sq.datasets._image.__all__ else _cached(func, cache_dir)
+        func._installed = True
+        setattr(sq.datasets, name, func)
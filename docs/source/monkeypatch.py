@@ -1,12 +1,58 @@
-from typing import Any, Dict
+from typing import Any, Set, Dict, List, Tuple, Optional
+from pathlib import Path
+from collections import Counter
 import os
 import re
+import sys
+import json
 import stat
+import time
 import codecs
+import shutil
+import hashlib
+import inspect
+import threading
+import multiprocessing
 
 from sphinx_gallery.utils import _replace_md5
 from sphinx_gallery.binder import gen_binder_rst, check_binder_conf
 from sphinx_gallery.gen_rst import CODE_DOWNLOAD, TIMING_CONTENT, replace_py_ipynb
+import sphinx_gallery.gen_rst
+import sphinx_gallery.backreferences
+
+GALLERY_CACHE = Path(
+    os.environ.get("SQUIDPY_NOTEBOOKS_GALLERY_CACHE", Path.home() / ".cache" / "squidpy_notebooks" / "gallery")
+)
+DATASET_MANIFEST = Path.home() / ".cache" / "squidpy" / "manifest.json"
+
+# entries of `sphinx_gallery_conf` which change the rendered outputs of the examples
+RENDER_CONF = (
+    "image_scrapers",
+    "reset_modules",
+    "show_memory",
+    "line_numbers",
+    "compress_images",
+    "remove_config_comments",
+    "download_all_examples",
+    "show_signature",
+    "capture_repr",
+    "thumbnail_size",
+    "min_reported_time",
+    "first_notebook_cell",
+    "last_notebook_cell",
+    "pypandoc",
+    "binder",
+)
+
+PROFILE_INTERVAL = 0.01  # in seconds
+PROFILE_TOP_N = 5
+
+_generate_file_rst = sphinx_gallery.gen_rst.generate_file_rst
+_execute_code_block = sphinx_gallery.gen_rst.execute_code_block
+# target file -> profiles of its code blocks
+_PROFILES: Dict[str, List[Dict[str, Any]]] = {}
+# entries of the gallery cache which were restored or written in this build
+_USED_ENTRIES: Set[str] = set()
 
 EXAMPLE_HEADER = """
 .. DO NOT EDIT.
@@ -62,6 +108,12 @@ def save_rst_example(
     if gallery_conf["show_memory"]:
         example_rst += f"**Estimated memory usage:** {memory_used: .0f} MB\n\n"
 
+    profiles = _PROFILES.pop(example_file, [])
+    if profiles:
+        example_rst += _profile_rst(profiles)
+        with open(re.sub(r"\.py$", "_profile.json", example_file), "w") as fout:
+            json.dump(profiles, fout, indent=4)
+
     # Generate a binder URL if specified
     fname = os.path.basename(example_file)
     example_rst += CODE_DOWNLOAD.format(fname, replace_py_ipynb(fname), "", ref_fname)
@@ -76,3 +128,359 @@ def save_rst_example(
     # in case it wasn't in our pattern, only replace the file if it's
     # still stale.
     _replace_md5(write_file_new, mode="t")
+
+
+class _Sampler:
+    """Sample the stack of the main thread and the RSS of the process from a background thread."""
+
+    def __init__(self, src_file: str, exclude: Tuple[str, ...], interval: float = PROFILE_INTERVAL):
+        self._src_file = src_file
+        self._exclude = exclude
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._main_id = threading.main_thread().ident
+        self.counts: Counter = Counter()
+        self.n_samples = 0
+        self.rss_start: Optional[int] = None
+        self.rss_peak: Optional[int] = None
+
+    def _rss(self) -> Optional[int]:
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            return None
+
+    def _run(self) -> None:
+        src_file, exclude = self._src_file, self._exclude
+        while not self._stop.wait(self._interval):
+            frame = sys._current_frames().get(self._main_id)
+            seen = set()
+            # only the callees of the example's module-level code are of interest
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename == src_file and code.co_name == "<module>":
+                    self.counts.update(seen)
+                    break
+                if not code.co_filename.startswith(exclude):
+                    seen.add(f"{frame.f_globals.get('__name__', '?')}.{code.co_name}")
+                frame = frame.f_back
+            self.n_samples += 1
+            rss = self._rss()
+            if rss is not None:
+                self.rss_peak = max(self.rss_peak, rss)
+
+    def __enter__(self) -> "_Sampler":
+        self.rss_start = self.rss_peak = self._rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def hot_functions(self, n: int = PROFILE_TOP_N) -> List[Dict[str, Any]]:
+        """Functions present in most of the samples, including the time spent in their callees."""
+        if not self.n_samples:
+            return []
+        return [{"function": name, "fraction": count / self.n_samples} for name, count in self.counts.most_common(n)]
+
+
+def execute_code_block(
+    compiler: Any,
+    block: Tuple[str, str, int],
+    example_globals: Any,
+    script_vars: Dict[str, Any],
+    *args: Any,
+    **kwargs: Any,
+) -> str:
+    """Execute the code block of the example file and profile its wall time, peak memory and hot functions."""
+    # the remaining arguments differ between the versions of sphinx-gallery, e.g. `gallery_conf` and `file_conf`
+    if not script_vars["execute_script"] or block[0] == "text":
+        return _execute_code_block(compiler, block, example_globals, script_vars, *args, **kwargs)
+
+    exclude = (os.path.dirname(sphinx_gallery.__file__), __file__)
+    if "memory_profiler" in sys.modules:
+        exclude += (sys.modules["memory_profiler"].__file__,)
+    with _Sampler(script_vars["src_file"], exclude) as sampler:
+        start = time.perf_counter()
+        res = _execute_code_block(compiler, block, example_globals, script_vars, *args, **kwargs)
+        wall_time = time.perf_counter() - start
+
+    _PROFILES.setdefault(script_vars["target_file"], []).append(
+        {
+            "line": block[2],
+            "wall_time": wall_time,
+            "peak_rss_delta_mb": None
+            if sampler.rss_start is None
+            else (sampler.rss_peak - sampler.rss_start) / 2 ** 20,
+            "hot_functions": sampler.hot_functions(),
+        }
+    )
+
+    return res
+
+
+def _profile_rst(profiles: List[Dict[str, Any]]) -> str:
+    rows = []
+    for profile in profiles:
+        rss = "n/a" if profile["peak_rss_delta_mb"] is None else f"{profile['peak_rss_delta_mb']:+.0f} MB"
+        hot = ", ".join(f"``{f['function']}`` ({f['fraction']:.0%})" for f in profile["hot_functions"]) or "-"
+        rows.append(f"   * - {profile['line']}\n     - {profile['wall_time']:.2f} s\n     - {rss}\n     - {hot}\n")
+
+    return (
+        "**Profile of the code blocks:**\n\n"
+        ".. list-table::\n"
+        "   :header-rows: 1\n"
+        "   :widths: 10 15 15 60\n\n"
+        "   * - Line\n     - Wall time\n     - Peak memory\n     - Hot functions\n" + "".join(rows) + "\n"
+    )
+
+
+def _stable_repr(obj: Any) -> str:
+    # the `repr` of functions contains their address, which changes between the builds
+    if callable(obj):
+        try:
+            return inspect.getsource(obj)
+        except (OSError, TypeError):
+            return getattr(obj, "__qualname__", type(obj).__qualname__)
+    if isinstance(obj, (list, tuple)):
+        return repr([_stable_repr(o) for o in obj])
+    if isinstance(obj, dict):
+        return repr(sorted((str(k), _stable_repr(v)) for k, v in obj.items()))
+
+    return repr(obj)
+
+
+def _cache_key(src_file: str, gallery_conf: Dict[str, Any]) -> str:
+    import sphinx_gallery
+
+    import scanpy
+    import anndata
+    import squidpy
+
+    sha = hashlib.sha256(os.path.basename(src_file).encode())
+    with open(src_file, "rb") as fin:
+        sha.update(fin.read())
+    for module in (squidpy, scanpy, anndata, sphinx_gallery):
+        sha.update(f"{module.__name__}=={module.__version__}".encode())
+    if DATASET_MANIFEST.is_file():
+        sha.update(DATASET_MANIFEST.read_bytes())
+    else:
+        # not downloaded by `download_data.py`, e.g. by the examples themselves
+        for path in sorted(DATASET_MANIFEST.parent.glob("*")):
+            if path.suffix in (".h5ad", ".tiff", ".zarr"):
+                stat = path.stat()
+                sha.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    # the code and the configuration which render the outputs
+    with open(__file__, "rb") as fin:
+        sha.update(fin.read())
+    sha.update(_stable_repr({key: gallery_conf.get(key) for key in RENDER_CONF}).encode())
+
+    return sha.hexdigest()
+
+
+def _outputs(target_dir: str, fname: str) -> List[Path]:
+    stem = os.path.splitext(fname)[0]
+    patterns = (
+        f"{stem}.rst",
+        f"{stem}.py.md5",
+        f"{stem}.ipynb",
+        f"{stem}_codeobj.pickle",
+        f"images/sphx_glr_{stem}_[0-9][0-9][0-9].png",
+        f"images/thumb/sphx_glr_{stem}_thumb.png",
+        f"{stem}_profile.json",
+    )
+
+    return [path.relative_to(target_dir) for pattern in patterns for path in Path(target_dir).glob(pattern)]
+
+
+def _is_cached(src_file: str, gallery_conf: Dict[str, Any]) -> bool:
+    return (GALLERY_CACHE / _cache_key(src_file, gallery_conf) / "cost.json").is_file()
+
+
+def _remove_md5(target_dir: str, fname: str) -> None:
+    # the example is stale w.r.t. its dependencies, even if the source did not change
+    md5_file = Path(target_dir) / f"{fname}.md5"
+    if md5_file.is_file():
+        md5_file.unlink()
+
+
+def _gallery_dirs(gallery_conf: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Source and target directories of all the galleries and their subsections."""
+    res = []
+    examples_dirs, gallery_dirs = gallery_conf["examples_dirs"], gallery_conf["gallery_dirs"]
+    if not isinstance(examples_dirs, list):
+        examples_dirs, gallery_dirs = [examples_dirs], [gallery_dirs]
+    for examples_dir, gallery_dir in zip(examples_dirs, gallery_dirs):
+        src_dir = Path(gallery_conf["src_dir"]) / examples_dir
+        target_dir = Path(gallery_conf["src_dir"]) / gallery_dir
+        res.append((str(src_dir), str(target_dir)))
+        for subdir in sorted(src_dir.iterdir()):
+            if subdir.is_dir() and any((subdir / f"README.{ext}").is_file() for ext in ("txt", "rst")):
+                res.append((str(subdir), str(target_dir / subdir.name)))
+
+    return res
+
+
+# state inherited by the forked workers
+_WORKER_STATE: Dict[str, Any] = {}
+_PENDING: Dict[str, Any] = {}
+
+
+def _execute(fname: str, target_dir: str, src_dir: str) -> Tuple[Any, ...]:
+    """Execute an example in a worker, recording the outputs which are written by the parent process."""
+    gallery_conf = _WORKER_STATE["gallery_conf"]
+    recorded: Dict[str, Any] = {"rst": None, "backrefs": None}
+
+    def record_rst(example_rst: str, example_file: str, time_elapsed: float, memory_used: float, _: Any) -> None:
+        recorded["rst"] = (example_rst, example_file, time_elapsed, memory_used)
+
+    def record_backrefs(backrefs: Any, _: Any, __: Any, *args: Any) -> None:
+        recorded["backrefs"] = (backrefs,) + args
+
+    sphinx_gallery.gen_rst.save_rst_example = record_rst
+    sphinx_gallery.gen_rst._write_backreferences = record_backrefs
+
+    src_file = os.path.normpath(os.path.join(src_dir, fname))
+    res = _generate_file_rst(fname, target_dir, src_dir, gallery_conf)
+    profiles = _PROFILES.pop(os.path.join(target_dir, fname), [])
+
+    return res, recorded["rst"], recorded["backrefs"], gallery_conf["failing_examples"].get(src_file), profiles
+
+
+def _dispatch(gallery_conf: Dict[str, Any]) -> None:
+    """Submit all stale examples of all galleries to a pool of forked processes."""
+    _WORKER_STATE["gallery_conf"] = gallery_conf
+    # each example is executed in a fresh fork, so that the examples cannot influence each other
+    pool = multiprocessing.get_context("fork").Pool(gallery_conf["n_jobs"], maxtasksperchild=1)
+    _WORKER_STATE["pool"] = pool
+
+    for src_dir, target_dir in _gallery_dirs(gallery_conf):
+        for fname in sorted(os.listdir(src_dir)):
+            src_file = os.path.normpath(os.path.join(src_dir, fname))
+            if (
+                not fname.endswith(".py")
+                or not re.search(gallery_conf["filename_pattern"], src_file)
+                or _is_cached(src_file, gallery_conf)
+            ):
+                continue
+            # sphinx-gallery creates these lazily, which is racy when done in the workers
+            os.makedirs(os.path.join(target_dir, "images", "thumb"), exist_ok=True)
+            _remove_md5(target_dir, fname)
+            _PENDING[src_file] = pool.apply_async(_execute, (fname, target_dir, src_dir))
+    pool.close()
+
+
+def _collect(src_file: str, gallery_conf: Dict[str, Any], seen_backrefs: Any) -> Tuple[str, str, Tuple[float, float]]:
+    """Write the outputs recorded by the worker in the order in which sphinx-gallery requests the examples."""
+    (intro, title, cost), rst, backrefs, failure, profiles = _PENDING.pop(src_file).get()
+    if not _PENDING:
+        _WORKER_STATE["pool"].join()
+
+    gallery_conf["titles"][src_file] = title
+    if failure is not None:
+        gallery_conf["failing_examples"][src_file] = failure
+    if rst is not None:
+        _PROFILES[rst[1]] = profiles
+        save_rst_example(*rst, gallery_conf)
+    if backrefs is not None:
+        seen_backrefs = set() if seen_backrefs is None else seen_backrefs
+        sphinx_gallery.backreferences._write_backreferences(backrefs[0], seen_backrefs, gallery_conf, *backrefs[1:])
+
+    return intro, title, cost
+
+
+def generate_file_rst(
+    fname: str, target_dir: str, src_dir: str, gallery_conf: Dict[str, Any], seen_backrefs: Any = None
+) -> Tuple[str, str, Tuple[float, float]]:
+    """
+    Generate the rst file for a given example, restoring the outputs of unchanged examples from a cache.
+
+    The cache is located in :data:`GALLERY_CACHE` and is keyed on the content of the example,
+    the versions of the libraries it uses, the manifest of the downloaded datasets, this module
+    and the entries of ``gallery_conf`` listed in :data:`RENDER_CONF`.
+    If ``gallery_conf['n_jobs'] > 1``, all stale examples are executed by a pool of processes
+    when the first example is requested.
+
+    Parameters
+    ----------
+    fname
+        Filename of python script.
+    target_dir
+        Absolute path to directory in documentation where examples are saved.
+    src_dir
+        Absolute path to directory where source examples are stored.
+    gallery_conf
+        Sphinx-Gallery configuration dictionary.
+    seen_backrefs
+        The seen backreferences.
+
+    Returns
+    -------
+    The introduction, title and the ``(time, memory)`` required to run the example.
+    """
+    if not gallery_conf["plot_gallery"]:
+        return _generate_file_rst(fname, target_dir, src_dir, gallery_conf, seen_backrefs)
+
+    src_file = os.path.normpath(os.path.join(src_dir, fname))
+    entry = GALLERY_CACHE / _cache_key(src_file, gallery_conf)
+    _USED_ENTRIES.add(entry.name)
+
+    if gallery_conf.get("n_jobs", 1) > 1 and "pool" not in _WORKER_STATE:
+        _dispatch(gallery_conf)
+
+    if src_file in _PENDING:
+        intro, title, cost = _collect(src_file, gallery_conf, seen_backrefs)
+    elif (entry / "cost.json").is_file():
+        for path in _outputs(str(entry), fname):
+            (Path(target_dir) / path).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(entry / path, Path(target_dir) / path)
+        # the restored `.md5` is current, so the example is not executed
+        intro, title, _ = _generate_file_rst(fname, target_dir, src_dir, gallery_conf, seen_backrefs)
+        with open(entry / "cost.json") as fin:
+            return intro, title, tuple(json.load(fin))
+    else:
+        _remove_md5(target_dir, fname)
+        intro, title, cost = _generate_file_rst(fname, target_dir, src_dir, gallery_conf, seen_backrefs)
+
+    if src_file in gallery_conf["failing_examples"]:
+        return intro, title, cost
+
+    tmp = entry.with_name(entry.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    for path in _outputs(target_dir, fname):
+        (tmp / path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(Path(target_dir) / path, tmp / path)
+    with open(tmp / "cost.json", "w") as fout:
+        json.dump(list(cost), fout)
+    shutil.rmtree(entry, ignore_errors=True)
+    tmp.rename(entry)
+
+    return intro, title, cost
+
+
+def prune_gallery_cache(app: Any, exception: Optional[Exception]) -> None:
+    """
+    Remove the entries of the gallery cache which were neither restored nor written in this build.
+
+    Parameters
+    ----------
+    app
+        Sphinx application.
+    exception
+        Exception raised during the build, if any.
+
+    Returns
+    -------
+    None
+    """
+    # nothing was executed or restored, e.g. when building without the examples
+    if exception is not None or not _USED_ENTRIES or not GALLERY_CACHE.is_dir():
+        return
+
+    for entry in GALLERY_CACHE.iterdir():
+        if entry.name not in _USED_ENTRIES:
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,154 @@
+from typing import Any, Mapping, Callable, Optional
+from pathlib import Path
+from functools import wraps
+import os
+import pickle
+import hashlib
+import inspect
+
+import numpy as np
+import xarray as xr
+
+# opt-in, the results are only cached if the directory is set, e.g. to re-run the scripts after editing them
+CACHE_DIR_ENV = "SQUIDPY_NOTEBOOKS_PROCESS_CACHE"
+CACHE_SIZE_ENV = "SQUIDPY_NOTEBOOKS_PROCESS_CACHE_SIZE"
+_DEFAULT_SIZE = 4096  # in MiB
+# arguments which don't change the result
+_IGNORED = ("n_jobs", "backend", "show_progress_bar")
+
+
+def _hash_array(arr: Any) -> str:
+    sha = hashlib.sha1()
+    sha.update(repr((getattr(arr, "dims", None), arr.shape, str(arr.dtype))).encode())
+    sha.update(np.ascontiguousarray(arr))
+
+    return sha.hexdigest()
+
+
+def _hash_layers(img: Any, layer: Optional[str]) -> str:
+    return repr(
+        [(name, _hash_array(img.data[name])) for name in ([layer] if layer is not None else sorted(img.data.data_vars))]
+    )
+
+
+def _evict(cache_dir: Path, max_size: int) -> None:
+    # least recently used first, the modification time is updated on each hit
+    files = sorted(cache_dir.glob("*.pickle"), key=lambda f: f.stat().st_mtime)
+    size = sum(f.stat().st_size for f in files)
+    for f in files:
+        if size <= max_size:
+            break
+        size -= f.stat().st_size
+        try:
+            f.unlink()
+        except FileNotFoundError:
+            # already removed by another process
+            pass
+
+
+def _versions() -> str:
+    import squidpy
+
+    import scipy
+
+    import skimage
+
+    # replaying the results of a previous version would hide the changes of the processing functions
+    return " ".join(f"{module.__name__}=={module.__version__}" for module in (squidpy, scipy, skimage))
+
+
+def _stable(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        # e.g. `apply_kwargs`
+        return sorted((k, _stable(v)) for k, v in value.items() if k not in _IGNORED)
+    if isinstance(value, (np.ndarray, xr.DataArray)):
+        # the `repr` of large arrays is abbreviated, e.g. of the `markers`
+        return _hash_array(value)
+
+    return value
+
+
+def _cached(func: Callable[..., Any], cache_dir: Path, max_size: int, versions: str) -> Callable[..., Any]:
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        bound = signature.bind(*args, **kwargs)
+        params = dict(bound.arguments)
+        for name, param in signature.parameters.items():
+            if param.kind == inspect.Parameter.VAR_KEYWORD:
+                params.update(params.pop(name, {}))
+        img = params.pop("img")
+        if params.get("copy", False) or params.get("lazy", False) or callable(params.get("method")):
+            # the returned copies and the lazy layers, i.e. not yet computed, are not cached,
+            # neither are custom functions, their `repr` is not stable
+            return func(*args, **kwargs)
+
+        params = {k: _stable(v) for k, v in params.items() if k not in _IGNORED}
+        key = repr((func.__name__, versions, _hash_layers(img, params.get("layer")), sorted(params.items())))
+        path = cache_dir / f"{func.__name__}-{hashlib.sha1(key.encode()).hexdigest()}.pickle"
+        if path.is_file():
+            with open(path, "rb") as fin:
+                layers = pickle.load(fin)
+            path.touch()
+            for name, arr in layers.items():
+                img.data[name] = arr
+            return None
+
+        before = dict(img.data.variables)
+        res = func(*args, **kwargs)
+        # the new layers, as well as the existing ones which were overwritten
+        layers = {
+            name: img.data[name] for name in img.data.data_vars if img.data.variables[name] is not before.get(name)
+        }
+
+        tmp = path.with_name(f"{path.name}.{os.getpid()}")
+        with open(tmp, "wb") as fout:
+            pickle.dump(layers, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+        _evict(cache_dir, max_size)
+
+        return res
+
+    wrapper._cached = True
+
+    return wrapper
+
+
+def install(cache_dir: Optional[Path] = None, max_size: Optional[int] = None) -> None:
+    """
+    Cache the layers added by :func:`squidpy.im.process` and :func:`squidpy.im.segment` on disk.
+
+    The results are keyed by the hash of the input layer's data, by all the other arguments, including
+    the method and the tile size, and by the versions of :mod:`squidpy`, :mod:`scipy` and :mod:`skimage`,
+    so that the same processing of an unchanged image is not computed again.
+
+    Parameters
+    ----------
+    cache_dir
+        Directory where to pickle the added layers. If `None`, use the directory from the
+        ``SQUIDPY_NOTEBOOKS_PROCESS_CACHE`` environment variable. If it is not set, nothing is cached.
+    max_size
+        Maximum size of the cache in MiB, the least recently used results are removed first.
+        If `None`, use the ``SQUIDPY_NOTEBOOKS_PROCESS_CACHE_SIZE`` environment variable, if set, or 4096 MiB.
+
+    Returns
+    -------
+    None
+    """
+    if cache_dir is None:
+        if not os.environ.get(CACHE_DIR_ENV):
+            return
+        cache_dir = Path(os.environ[CACHE_DIR_ENV])
+    if max_size is None:
+        max_size = int(os.environ.get(CACHE_SIZE_ENV, _DEFAULT_SIZE))
+
+    import squidpy as sq
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    versions = _versions()
+    for name in ("process", "segment"):
+        func = getattr(sq.im, name)
+        if not getattr(func, "_cached", False):
+            setattr(sq.im, name, _cached(func, cache_dir, max_size * 2 ** 20, versions))
@@ -147,5 +147,11 @@ _ = sns.displot(
 # ===============
 # Speeding up the feature extraction is easy.
 # Just set the ``n_jobs`` flag to the number of jobs that should be used by :func:`squidpy.im.calculate_image_features`.
+#
+# By default, each job runs in a separate worker process. Large arrays, such as the image, are memory-mapped
+# by :mod:`joblib` instead of being copied into each worker, but every worker imports the libraries again,
+# which adds a few hundred MB of memory per job. ``backend = 'threading'`` avoids the worker processes,
+# but since most of the feature extraction holds the GIL, it is usually not faster than a single job.
+
 # extract features by using 4 jobs
 sq.im.calculate_image_features(adata, img, features="summary", key_added="features", n_jobs=4, show_progress_bar=False)
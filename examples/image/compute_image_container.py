@@ -11,6 +11,9 @@ This example shows how to use :class:`squidpy.im.ImageContainer` to interact wit
     :class:`squidpy.im.ImageContainer`.
 """
 
+from pathlib import Path
+import tempfile
+
 import squidpy as sq
 
 ###############################################################################
@@ -33,9 +36,20 @@ print(img["image"])
 
 ###############################################################################
 # Lazy loading:
-# The image data can be lazily loaded with `netcdf` and explicitly loaded into
-# memory via ``.data.load()`` and saved to disk via ``.save()``:
+# The image data is loaded lazily and can be explicitly loaded into memory via ``.data.load()``.
+# It can be saved to disk as a chunked `Zarr <https://zarr.readthedocs.io>`_ store via ``.save()``,
+# the size of the chunks is set by the ``encoding`` of each layer.
 img.data.load()
+for layer in img.data.data_vars.values():
+    layer.encoding["chunks"] = (1024, 1024) + layer.shape[2:]
+path = Path(tempfile.mkdtemp()) / "visium_hne_image.zarr"
+img.save(path)
+
+###############################################################################
+# When loading the store with ``chunks``, the layers are :mod:`dask` arrays backed by the store,
+# so that e.g. cropping the image only reads the chunks of the crop from disk.
+img = sq.im.ImageContainer.load(path, chunks={})
+print(img["image"].data)
 
 ###############################################################################
 # You can add images into the ImageContainer using ``.add_img()``:
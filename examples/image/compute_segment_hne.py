@@ -22,7 +22,6 @@ import squidpy as sq
 
 import numpy as np
 
-import seaborn as sns
 import matplotlib.pyplot as plt
 
 # load H&E stained tissue image and crop to a smaller segment
@@ -54,7 +53,9 @@ for layer, ax in zip(["image", "image_smooth"], axes):
 fig, axes = plt.subplots(1, 3, figsize=(15, 4))
 crop.show("image_smooth", cmap="gray", ax=axes[0])
 axes[1].imshow(crop["image_smooth"][:, :, 0] < 0.36)
-_ = sns.histplot(np.array(crop["image_smooth"]).flatten(), bins=50, ax=axes[2])
+# only the counts are computed from the layer's values, without making a flattened copy of the image
+counts, bins = np.histogram(crop["image_smooth"].values, bins=50)
+_ = axes[2].bar(bins[:-1], counts, width=np.diff(bins), align="edge")
 plt.tight_layout()
 
 ###############################################################################
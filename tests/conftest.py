@@ -1,3 +1,213 @@
+from typing import Any, Dict, List, Tuple, Callable, Iterator
+from pathlib import Path
+from functools import partial
+from threading import Lock, Thread
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import os
+import json
+import time
+import shutil
+import tempfile
+import warnings
+
+import pytest
+
 import matplotlib
 
 matplotlib.use("Agg")
+
+ROOT = Path(__file__).parent.parent
+_RESOURCES: Dict[str, Dict[str, float]] = {}
+_MEASURED: Dict[str, Dict[str, float]] = {}
+_BUDGETED = ("wall_time", "peak_rss_mb")
+_DATASET_CACHE_ENV = "SQUIDPY_NOTEBOOKS_DATASET_CACHE"
+
+
+class ResourceBudgetWarning(UserWarning):
+    """Warning issued when a script exceeds its resource budget."""
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--resource-report",
+        default=None,
+        help="Write the wall time, CPU time and peak RSS of each executed script as JSON into this file.",
+    )
+    parser.addoption(
+        "--no-dataset-cache",
+        action="store_true",
+        help="Do not share the datasets loaded by the executed scripts, parse them again in each script.",
+    )
+    group = parser.getgroup("budgets", "resource budgets of the executed scripts")
+    group.addoption(
+        "--budgets",
+        default=str(ROOT / "tests" / "budgets.json"),
+        help="JSON file with the baseline wall time [s] and peak RSS [MB] of each script.",
+    )
+    group.addoption(
+        "--budget-margin",
+        type=float,
+        default=0.25,
+        help="Allowed relative increase over the baseline before a budget is considered exceeded.",
+    )
+    group.addoption(
+        "--budget-action",
+        choices=("warn", "fail"),
+        default="warn",
+        help="Whether to warn or to fail the test when a script exceeds its budget.",
+    )
+    group.addoption(
+        "--update-budgets",
+        action="store_true",
+        help="Store the measured resources of the executed scripts as the new baseline.",
+    )
+
+
+def pytest_configure(config):
+    # the environment is inherited by the `pytest-xdist` workers and the processes executing the scripts
+    if hasattr(config, "workerinput"):
+        return
+    if config.getoption("--no-dataset-cache"):
+        # the dataset cache is only installed in the executed scripts if its directory is set
+        os.environ.pop(_DATASET_CACHE_ENV, None)
+    else:
+        os.environ[_DATASET_CACHE_ENV] = tempfile.mkdtemp(prefix="squidpy_datasets_")
+
+
+def pytest_unconfigure(config):
+    if not hasattr(config, "workerinput") and _DATASET_CACHE_ENV in os.environ:
+        shutil.rmtree(os.environ.pop(_DATASET_CACHE_ENV), ignore_errors=True)
+
+
+def pytest_runtest_logreport(report):
+    # with `pytest-xdist`, the reports (including the user properties) are forwarded to the controller
+    if report.when == "call":
+        for name, value in report.user_properties:
+            if name == "resources":
+                _RESOURCES[report.nodeid] = value
+            elif name == "budget":
+                script, resources = value
+                _MEASURED[script] = resources
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if hasattr(config, "workerinput"):
+        return
+
+    path = config.getoption("--resource-report")
+    if path is not None and _RESOURCES:
+        with open(path, "w") as fout:
+            json.dump(dict(sorted(_RESOURCES.items())), fout, indent=4)
+
+    if config.getoption("--update-budgets") and _MEASURED:
+        path = Path(config.getoption("--budgets"))
+        budgets = json.loads(path.read_text()) if path.is_file() else {}
+        for script, resources in _MEASURED.items():
+            budgets[script] = {key: round(resources[key], 1) for key in _BUDGETED}
+        path.write_text(json.dumps(dict(sorted(budgets.items())), indent=4) + "\n")
+
+
+@pytest.fixture(scope="session")
+def _budgets(pytestconfig) -> Dict[str, Dict[str, float]]:
+    path = Path(pytestconfig.getoption("--budgets"))
+    return json.loads(path.read_text()) if path.is_file() else {}
+
+
+@pytest.fixture()
+def resource_budget(request, pytestconfig, _budgets) -> Callable[[str, Dict[str, float]], None]:
+    """Check the measured resources of a script against its baseline in the budget file."""
+    margin = pytestconfig.getoption("--budget-margin")
+    action = pytestconfig.getoption("--budget-action")
+
+    def check(script: str, resources: Dict[str, float]) -> None:
+        script = Path(script).resolve().relative_to(ROOT.resolve()).as_posix()
+        request.node.user_properties.append(("budget", (script, resources)))
+
+        exceeded = [
+            f"`{key}` is `{resources[key]:.1f}`, baseline is `{baseline:.1f}`"
+            for key, baseline in _budgets.get(script, {}).items()
+            if key in _BUDGETED and resources[key] > baseline * (1 + margin)
+        ]
+        if not exceeded:
+            return
+
+        msg = f"Script `{script}` exceeded its budget by more than `{margin:.0%}`: " + ", ".join(exceeded) + "."
+        if action == "fail":
+            pytest.fail(msg)
+        warnings.warn(msg, ResourceBudgetWarning, stacklevel=2)
+
+    return check
+
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serve files from a directory, honoring single ``bytes=<start>-`` range requests."""
+
+    def do_GET(self) -> None:
+        server = self.server
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        data = path.read_bytes()
+        rng = self.headers.get("Range")
+        server.requests.append((path.name, rng))
+
+        with server.lock:
+            server.n_active += 1
+            server.max_active = max(server.max_active, server.n_active)
+        try:
+            # give the other threads a chance to connect, so that the concurrency can be observed
+            time.sleep(server.delay)
+            if rng is None or not server.accept_ranges:
+                start = 0
+                self.send_response(200)
+            else:
+                start = int(rng.split("=")[1].split("-")[0])
+                if start >= len(data):
+                    self.send_error(416)
+                    return
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            self.wfile.write(data[start:])
+        finally:
+            with server.lock:
+                server.n_active -= 1
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.requests: List[Tuple[str, Any]] = []
+        self.lock = Lock()
+        self.n_active = 0
+        self.max_active = 0
+        self.delay = 0.1
+        self.accept_ranges = True
+
+    def url(self, fname: str) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/{fname}"
+
+
+@pytest.fixture()
+def http_server(tmp_path: Path) -> Iterator[_HTTPServer]:
+    """Local stand-in for the dataset hosting, serving files from ``tmp_path / 'remote'``."""
+    root = tmp_path / "remote"
+    root.mkdir()
+
+    server = _HTTPServer(("127.0.0.1", 0), partial(_RangeRequestHandler, directory=str(root)))
+    server.root = root
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
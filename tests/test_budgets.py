@@ -0,0 +1,70 @@
+from pathlib import Path
+import json
+import shutil
+
+import pytest
+
+pytest_plugins = ["pytester"]
+
+ROOT = Path(__file__).parent.parent
+_SCRIPT = "examples/image/compute_script.py"
+_RESOURCES = {"wall_time": 12.0, "cpu_time": 10.0, "peak_rss_mb": 1000.0}
+
+
+@pytest.fixture()
+def run(pytester):
+    """Check the resources in ``_RESOURCES`` against the given baselines in a separate pytest session."""
+    (pytester.path / "tests").mkdir()
+    shutil.copy(ROOT / "tests" / "conftest.py", pytester.path / "tests" / "conftest.py")
+    pytester.makepyfile(
+        **{
+            "tests/test_script": f"""
+def test_script(resource_budget):
+    resource_budget({str(pytester.path / _SCRIPT)!r}, {_RESOURCES!r})
+"""
+        }
+    )
+    budgets = pytester.path / "budgets.json"
+
+    def _run(baseline, *args):
+        budgets.write_text(json.dumps({_SCRIPT: baseline}))
+        return pytester.runpytest_subprocess("tests", "--no-dataset-cache", "--budgets", str(budgets), *args)
+
+    _run.budgets = budgets
+
+    return _run
+
+
+def test_within_budget(run):
+    result = run({"wall_time": 10.0, "peak_rss_mb": 800.0})
+
+    result.assert_outcomes(passed=1)
+    result.stdout.no_fnmatch_line("*ResourceBudgetWarning*")
+
+
+@pytest.mark.parametrize("baseline", [{"wall_time": 9.0}, {"peak_rss_mb": 700.0}])
+def test_exceeded_warn(run, baseline):
+    result = run(baseline)
+
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["*ResourceBudgetWarning: Script `examples/image/compute_script.py` exceeded*"])
+
+
+def test_exceeded_fail(run):
+    result = run({"wall_time": 9.0, "peak_rss_mb": 700.0}, "--budget-action", "fail")
+
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(["*`wall_time` is `12.0`, baseline is `9.0`, `peak_rss_mb` is `1000.0`*"])
+
+
+def test_margin(run):
+    result = run({"wall_time": 9.0, "peak_rss_mb": 700.0}, "--budget-action", "fail", "--budget-margin", "0.5")
+
+    result.assert_outcomes(passed=1)
+
+
+def test_update_budgets(run):
+    result = run({"wall_time": 1.0}, "--update-budgets")
+
+    result.assert_outcomes(passed=1)
+    assert json.loads(run.budgets.read_text()) == {_SCRIPT: {"wall_time": 12.0, "peak_rss_mb": 1000.0}}
@@ -0,0 +1,68 @@
+from typing import Any, Dict, Optional
+from pathlib import Path
+import importlib.util
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+_spec = importlib.util.spec_from_file_location("dataset_cache", ROOT / "docs" / "source" / "dataset_cache.py")
+dataset_cache = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dataset_cache)
+
+_spec = importlib.util.spec_from_file_location("download_data", ROOT / ".scripts" / "download" / "download_data.py")
+download_data = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(download_data)
+
+
+@pytest.fixture()
+def loader():
+    calls = []
+
+    def visium_hne_adata(path: Optional[str] = None) -> Dict[str, Any]:
+        calls.append(path)
+        return {"X": [0, 1, 2]}
+
+    visium_hne_adata.calls = calls
+
+    return visium_hne_adata
+
+
+def test_cached(loader, tmp_path: Path):
+    cached = dataset_cache._cached(loader, tmp_path)
+
+    first, second = cached(), cached()
+
+    assert loader.calls == [None]
+    assert first == second == {"X": [0, 1, 2]}
+    assert cached(path="foo") == first
+    assert loader.calls == [None, "foo"]
+    assert len(list(tmp_path.glob("visium_hne_adata-*.pickle"))) == 2
+
+
+def test_cached_not_shared(loader, tmp_path: Path):
+    cached = dataset_cache._cached(loader, tmp_path)
+
+    adata = cached()
+    adata["X"].append(3)
+    adata["obsm"] = [4, 5]
+
+    assert cached() == {"X": [0, 1, 2]}
+
+
+def test_prefer_zarr(tmp_path: Path):
+    sq = pytest.importorskip("squidpy")
+    import numpy as np
+    import dask.array as da
+
+    arr = np.random.RandomState(42).randint(0, 255, size=(300, 200, 3), dtype=np.uint8)
+    download_data._write_zarr(sq.im.ImageContainer(arr), tmp_path / "visium_hne_image.zarr", chunks=64)
+
+    def visium_hne_image(path=None):
+        raise AssertionError("The TIFF file should not be read.")
+
+    img = dataset_cache._prefer_zarr(visium_hne_image)(path=tmp_path / "visium_hne_image.tiff")
+
+    assert isinstance(img["image"].data, da.Array)
+    assert img["image"].data.chunksize[:2] == (64, 64)
+    np.testing.assert_array_equal(img.crop_corner(100, 50, size=20)["image"].values.squeeze(), arr[100:120, 50:70])
@@ -0,0 +1,111 @@
+from pathlib import Path
+import os
+import importlib.util
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+_spec = importlib.util.spec_from_file_location("download_data", ROOT / ".scripts" / "download" / "download_data.py")
+download_data = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(download_data)
+
+
+def _remote_files(http_server, n: int, size: int = 3 * 2 ** 20):
+    files = {}
+    for i in range(n):
+        fname = f"dataset_{i}.h5ad"
+        data = os.urandom(size)
+        (http_server.root / fname).write_bytes(data)
+        files[fname] = data
+
+    return files
+
+
+def test_download_parallel(http_server, tmp_path: Path, capsys):
+    files = _remote_files(http_server, 4)
+    urls = [(http_server.url(fname), tmp_path / "cache" / fname) for fname in files]
+
+    paths = download_data._download_parallel(urls, n_jobs=4)
+
+    assert paths == [path for _, path in urls]
+    for fname, data in files.items():
+        assert (tmp_path / "cache" / fname).read_bytes() == data
+        assert not (tmp_path / "cache" / f"{fname}.part").exists()
+    assert http_server.max_active > 1
+    # single aggregated progress line
+    assert capsys.readouterr().out.rstrip("\n").split("\r")[-1] == "[Downloading] 4/4 files, 12.0/12.0 MiB"
+
+
+def test_download_resume(http_server, tmp_path: Path):
+    (fname, data), *_ = _remote_files(http_server, 1).items()
+    path = tmp_path / "cache" / fname
+    path.parent.mkdir()
+    path.with_name(f"{fname}.part").write_bytes(data[:12345])
+
+    download_data._download(http_server.url(fname), path)
+
+    assert path.read_bytes() == data
+    assert http_server.requests == [(fname, "bytes=12345-")]
+
+
+def test_download_resume_complete(http_server, tmp_path: Path):
+    (fname, data), *_ = _remote_files(http_server, 1).items()
+    path = tmp_path / "cache" / fname
+    path.parent.mkdir()
+    path.with_name(f"{fname}.part").write_bytes(data)
+
+    download_data._download(http_server.url(fname), path)
+
+    assert path.read_bytes() == data
+
+
+def test_download_resume_not_supported(http_server, tmp_path: Path):
+    (fname, data), *_ = _remote_files(http_server, 1).items()
+    path = tmp_path / "cache" / fname
+    path.parent.mkdir()
+    path.with_name(f"{fname}.part").write_bytes(b"garbage")
+    http_server.accept_ranges = False
+
+    download_data._download(http_server.url(fname), path)
+
+    assert path.read_bytes() == data
+
+
+def test_verify(tmp_path: Path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"dataset_{i}.tiff"
+        path.write_bytes(os.urandom(2 * download_data._CHUNK_SIZE + i))
+        paths.append(path)
+    manifest = {path.name: download_data._manifest_entry(path) for path in paths[:-1]}
+    download_data._write_manifest(manifest, tmp_path / "manifest.json")
+    manifest = download_data._read_manifest(tmp_path / "manifest.json")
+
+    assert download_data._verify(paths, manifest, n_jobs=2) == {paths[0]: True, paths[1]: True}
+
+    # same size, different content
+    data = bytearray(paths[0].read_bytes())
+    data[-1] ^= 0xFF
+    paths[0].write_bytes(data)
+    # truncated
+    paths[1].write_bytes(paths[1].read_bytes()[:-1])
+
+    assert download_data._verify(paths, manifest, n_jobs=2) == {paths[0]: False, paths[1]: False}
+
+
+def test_write_zarr(tmp_path: Path):
+    sq = pytest.importorskip("squidpy")
+    import numpy as np
+
+    arr = np.random.RandomState(42).randint(0, 255, size=(1100, 700, 3), dtype=np.uint8)
+    paths = download_data._write_zarr(sq.im.ImageContainer(arr), tmp_path / "image.zarr", chunks=128)
+
+    assert [path.name for path in paths] == ["image.zarr", "image_level1.zarr", "image_level2.zarr"]
+    levels = [sq.im.ImageContainer.load(path, chunks={}) for path in paths]
+    assert levels[0]["image"].data.chunksize == (128, 128, 1, 3)
+    np.testing.assert_array_equal(levels[0]["image"][100:200, 300:400, 0].values, arr[100:200, 300:400])
+    assert [img.shape for img in levels] == [(1100, 700), (550, 350), (275, 175)]
+    assert [img.data.attrs["scale"] for img in levels] == [1, 0.5, 0.25]
+    assert levels[2]["image"].dtype == np.uint8
+    assert not list(tmp_path.glob("*.tmp"))
@@ -1,18 +1,77 @@
+from typing import Dict, Tuple
 from pathlib import Path
-import runpy
+import os
+import re
+import sys
+import time
+import subprocess
 
 import pytest
 
 ROOT = Path(__file__).parent.parent
-TUTORIALS = tuple(map(str, ((ROOT / "tutorials").resolve().glob("*.py"))))
-EXAMPLES = tuple(map(str, ((ROOT / "examples").resolve().glob("*/*.py"))))
+
+
+def _historical_times() -> Dict[str, float]:
+    """Execution times in seconds of the scripts, as recorded by the last documentation build."""
+    times = {}
+    for fname in (ROOT / "docs" / "source").glob("auto_*/**/sg_execution_times.rst"):
+        for match in re.finditer(r"\(``(\S+\.py)``\)\s*\|\s*(\d+):(\d+\.\d+)", fname.read_text()):
+            duration = 60 * int(match.group(2)) + float(match.group(3))
+            # `00:00.000` means that the script was not executed in that build, since it did not change
+            if duration > 0:
+                times[match.group(1)] = duration
+
+    return times
+
+
+def _longest_first(scripts: Tuple[Path, ...]) -> Tuple[str, ...]:
+    # scripts which were not executed yet are assumed to be the slowest
+    times = _historical_times()
+    return tuple(str(s) for s in sorted(scripts, key=lambda s: -times.get(s.name, float("inf"))))
+
+
+# sorting makes `pytest-xdist` schedule the longest scripts first
+TUTORIALS = _longest_first(tuple((ROOT / "tutorials").resolve().glob("*.py")))
+EXAMPLES = _longest_first(tuple((ROOT / "examples").resolve().glob("*/*.py")))
+
+# the datasets are shared between the scripts using the cache in `SQUIDPY_NOTEBOOKS_DATASET_CACHE`, see `conftest.py`
+# the results of `sq.im.process` and `sq.im.segment` are only cached if `SQUIDPY_NOTEBOOKS_PROCESS_CACHE` is set
+_BOOTSTRAP = (
+    f"import sys, runpy; sys.path.insert(0, {str(ROOT)!r}); "
+    # both are no-ops unless their cache directory is set, e.g. not with `--no-dataset-cache`
+    "from docs.source.dataset_cache import install; install(); "
+    "from docs.source.process_cache import install; install(); "
+    "sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def _run_script(script: str) -> Tuple[int, Dict[str, float]]:
+    """Run ``script`` in a separate process and return its exit code and its wall time, CPU time and peak RSS."""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", _BOOTSTRAP, script], env={**os.environ, "MPLBACKEND": "agg"})
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+    return proc.returncode, {
+        "wall_time": wall_time,
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        # bytes on macOS, kilobytes on Linux
+        "peak_rss_mb": rusage.ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10),
+    }
 
 
 @pytest.mark.parametrize("tutorial", TUTORIALS)
-def test_tutorials(tutorial):
-    runpy.run_path(tutorial)
+def test_tutorials(tutorial, record_property, resource_budget):
+    returncode, resources = _run_script(tutorial)
+    record_property("resources", resources)
+    assert returncode == 0, f"Tutorial `{tutorial}` failed with exit code `{returncode}`."
+    resource_budget(tutorial, resources)
 
 
 @pytest.mark.parametrize("example", EXAMPLES)
-def test_examples(example):
-    runpy.run_path(example)
+def test_examples(example, record_property, resource_budget):
+    returncode, resources = _run_script(example)
+    record_property("resources", resources)
+    assert returncode == 0, f"Example `{example}` failed with exit code `{returncode}`."
+    resource_budget(example, resources)
@@ -0,0 +1,149 @@
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import importlib.util
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+
+xr = pytest.importorskip("xarray")
+np = pytest.importorskip("numpy")
+
+_spec = importlib.util.spec_from_file_location("process_cache", ROOT / "docs" / "source" / "process_cache.py")
+process_cache = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(process_cache)
+
+
+class _Container:
+    """Stand-in for :class:`squidpy.im.ImageContainer`, whose layers are stored in an :class:`xarray.Dataset`."""
+
+    def __init__(self, seed: int = 0):
+        arr = np.random.RandomState(seed).rand(100, 100, 1)
+        self.data = xr.Dataset({"image": (("y", "x", "channels"), arr)})
+
+
+@pytest.fixture()
+def calls() -> List[Dict[str, Any]]:
+    return []
+
+
+@pytest.fixture()
+def process(calls):
+    def process(
+        img: _Container,
+        layer: Optional[str] = None,
+        method: str = "smooth",
+        layer_added: Optional[str] = None,
+        copy: bool = False,
+        **kwargs: Any,
+    ) -> Optional[Any]:
+        calls.append(kwargs)
+        res = img.data[layer] * kwargs.get("sigma", 1)
+        if copy:
+            return res
+        img.data[layer_added or f"{layer}_{method}"] = res
+
+    return process
+
+
+def _cached(process, cache_dir: Path, max_size: int = 2 ** 30, versions: str = "squidpy==1.0.0"):
+    return process_cache._cached(process, cache_dir, max_size, versions)
+
+
+def test_hit(process, calls, tmp_path: Path):
+    cached = _cached(process, tmp_path)
+
+    expected = _Container()
+    cached(expected, layer="image", method="smooth", sigma=2)
+    img = _Container()
+    cached(img, method="smooth", sigma=2, layer="image", n_jobs=4, show_progress_bar=False)
+
+    assert len(calls) == 1
+    xr.testing.assert_identical(img.data["image_smooth"], expected.data["image_smooth"])
+
+
+def test_hit_overwritten_layer(process, calls, tmp_path: Path):
+    cached = _cached(process, tmp_path)
+
+    cached(_Container(), layer="image", layer_added="image", sigma=2)
+    img = _Container()
+    cached(img, layer="image", layer_added="image", sigma=2)
+
+    assert len(calls) == 1
+    np.testing.assert_array_equal(img.data["image"], 2 * _Container().data["image"])
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"sigma": 3},
+        {"sigma": 2, "size": 1000},
+        {"sigma": 2, "method": "gray"},
+        {"sigma": 2, "seed": 1},
+        {"sigma": 2, "versions": "squidpy==1.1.0"},
+    ],
+)
+def test_miss(process, calls, tmp_path: Path, kwargs: Dict[str, Any]):
+    _cached(process, tmp_path)(_Container(), layer="image", sigma=2)
+    versions = kwargs.pop("versions", "squidpy==1.0.0")
+    seed = kwargs.pop("seed", 0)
+
+    _cached(process, tmp_path, versions=versions)(_Container(seed), layer="image", **kwargs)
+
+    assert len(calls) == 2
+    assert len(list(tmp_path.glob("process-*.pickle"))) == 2
+
+
+@pytest.mark.parametrize("wrap", [np.asarray, xr.DataArray])
+def test_miss_array_kwargs(process, calls, tmp_path: Path, wrap):
+    cached = _cached(process, tmp_path)
+    markers = np.zeros(10000)
+    other = markers.copy()
+    other[5000] = 1
+    # abbreviated
+    assert repr(wrap(markers)) == repr(wrap(other))
+
+    cached(_Container(), layer="image", sigma=2, markers=wrap(markers))
+    cached(_Container(), layer="image", sigma=2, markers=wrap(other))
+    cached(_Container(), layer="image", sigma=2, markers=wrap(other.copy()))
+
+    assert len(calls) == 2
+
+
+def test_lazy_not_cached(process, calls, tmp_path: Path):
+    cached = _cached(process, tmp_path)
+
+    for _ in range(2):
+        cached(_Container(), layer="image", sigma=2, lazy=True)
+
+    assert len(calls) == 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_copy_not_cached(process, calls, tmp_path: Path):
+    cached = _cached(process, tmp_path)
+
+    for _ in range(2):
+        res = cached(_Container(), layer="image", sigma=2, copy=True)
+        assert isinstance(res, xr.DataArray)
+
+    assert len(calls) == 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_evict_least_recently_used(process, calls, tmp_path: Path):
+    _cached(process, tmp_path)(_Container(), layer="image", sigma=1)
+    (entry,) = tmp_path.glob("process-*.pickle")
+    # room for 2 entries
+    cached = _cached(process, tmp_path, max_size=int(2.5 * entry.stat().st_size))
+
+    cached(_Container(), layer="image", sigma=2)
+    # hit, `sigma=2` is now the least recently used
+    cached(_Container(), layer="image", sigma=1)
+    cached(_Container(), layer="image", sigma=3)
+    assert [c["sigma"] for c in calls] == [1, 2, 3]
+    assert len(list(tmp_path.glob("process-*.pickle"))) == 2
+
+    cached(_Container(), layer="image", sigma=1)
+    cached(_Container(), layer="image", sigma=2)
+    assert [c["sigma"] for c in calls] == [1, 2, 3, 2]